@@ -7,10 +7,13 @@ Original file is located at
     https://colab.research.google.com/drive/1jritSyAyHMNaUUk2tl9zTlI20pkksEtN
 """
 
+import functools
+import os
+from multiprocessing import Pool
 import numpy as np
 from numpy import linalg as LA
 from scipy import special
-from scipy.linalg import expm
+from scipy.linalg import expm, get_lapack_funcs
 from scipy.sparse.linalg import LinearOperator, eigs
 from typing import List, Union, Tuple, Optional
 import matplotlib.pyplot as plt
@@ -69,9 +72,7 @@ def ncon(tensors: List[np.ndarray],
     if num_cont > 0:
       tensor_list[ele], connect_list[ele], cont_ind = partial_trace(
           tensor_list[ele], connect_list[ele])
-      con_order = np.delete(
-          con_order,
-          np.intersect1d(con_order, cont_ind, return_indices=True)[1])
+      con_order = con_order[~np.isin(con_order, cont_ind)]
 
   # do all binary contractions
   while len(con_order) > 0:
@@ -79,15 +80,19 @@ def ncon(tensors: List[np.ndarray],
     cont_ind = con_order[0]
     locs = [
         ele for ele in range(len(connect_list))
-        if sum(connect_list[ele] == cont_ind) > 0
+        if (connect_list[ele] == cont_ind).any()
     ]
 
-    # do binary contraction
-    cont_many, A_cont, B_cont = np.intersect1d(
-        connect_list[locs[0]],
-        connect_list[locs[1]],
-        assume_unique=True,
-        return_indices=True)
+    # do binary contraction; each label appears at most once on a tensor, so
+    # the shared labels are located with masks rather than set intersections
+    A_label = connect_list[locs[0]]
+    B_label = connect_list[locs[1]]
+    A_mask = np.isin(A_label, B_label)
+    B_mask = np.isin(B_label, A_label)
+    A_cont = np.flatnonzero(A_mask)
+    cont_many = A_label[A_cont]
+    B_sort = np.argsort(B_label)
+    B_cont = B_sort[np.searchsorted(B_label, cont_many, sorter=B_sort)]
     if np.size(tensor_list[locs[0]]) < np.size(tensor_list[locs[1]]):
       ind_order = np.argsort(A_cont)
     else:
@@ -98,19 +103,14 @@ def ncon(tensors: List[np.ndarray],
             tensor_list[locs[0]],
             tensor_list[locs[1]],
             axes=(A_cont[ind_order], B_cont[ind_order])))
-    connect_list.append(
-        np.append(
-            np.delete(connect_list[locs[0]], A_cont),
-            np.delete(connect_list[locs[1]], B_cont)))
+    connect_list.append(np.concatenate((A_label[~A_mask], B_label[~B_mask])))
 
     # remove contracted tensors from list and update con_order
     del tensor_list[locs[1]]
     del tensor_list[locs[0]]
     del connect_list[locs[1]]
     del connect_list[locs[0]]
-    con_order = np.delete(
-        con_order,
-        np.intersect1d(con_order, cont_many, return_indices=True)[1])
+    con_order = con_order[~np.isin(con_order, cont_many)]
 
   # do all outer products
   while len(tensor_list) > 1:
@@ -148,11 +148,9 @@ def partial_trace(A, A_label):
 
     B_label = np.delete(A_label, cont_ind)
     cont_label = np.unique(A_label[cont_ind])
-    B = np.zeros(np.prod(free_dim))
     A = A.transpose(np.append(free_ind, cont_ind)).reshape(
         np.prod(free_dim), cont_dim, cont_dim)
-    for ip in range(cont_dim):
-      B = B + A[:, ip, ip]
+    B = np.trace(A, axis1=1, axis2=2)
 
     return B.reshape(free_dim), B_label, cont_label
 
@@ -178,36 +176,69 @@ def check_inputs(connect_list, flat_connect, dims_list, con_order):
       raise ValueError((
           'number of indices does not match number of labels on tensor %i: '
           '%i-indices versus %i-labels')
-#           % (ele, len(dims_list[ele]), len(connect_list[ele])))
+          % (ele, len(dims_list[ele]), len(connect_list[ele])))
 
   # check that contraction order is valid
   if not np.array_equal(np.sort(con_order), np.unique(pos_ind)):
     raise ValueError(('NCON error: invalid contraction order'))
 
-  # check that negative indices are valid
-  for ind in np.arange(-1, -len(neg_ind) - 1, -1):
-    if sum(neg_ind == ind) == 0:
+  # check that negative indices are valid: labels -1 to -N each appear once
+  num_neg = len(neg_ind)
+  cnt_neg = np.bincount(-neg_ind.astype(int),
+                        minlength=num_neg + 1)[1:num_neg + 1]
+  bad_neg = np.flatnonzero(cnt_neg != 1)
+  if len(bad_neg) > 0:
+    ind = -(bad_neg[0] + 1)
+    if cnt_neg[bad_neg[0]] == 0:
       raise ValueError(('NCON error: no index labelled %i') % (ind))
-    elif sum(neg_ind == ind) > 1:
+    else:
       raise ValueError(('NCON error: more than one index labelled %i') % (ind))
 
   # check that positive indices are valid and contracted tensor dimensions match
   flat_dims = np.array([item for sublist in dims_list for item in sublist])
-  for ind in np.unique(pos_ind):
-    if sum(pos_ind == ind) == 1:
+  pos_order = np.argsort(pos_ind, kind='stable')
+  pos_dims = flat_dims[flat_connect > 0][pos_order]
+  labels, starts, counts = np.unique(pos_ind[pos_order], return_index=True,
+                                     return_counts=True)
+  dims_first = pos_dims[starts]
+  dims_second = pos_dims[np.minimum(starts + 1, len(pos_dims) - 1)]
+  bad_pos = np.flatnonzero((counts != 2) | (dims_first != dims_second))
+  if len(bad_pos) > 0:
+    ele = bad_pos[0]
+    ind = labels[ele]
+    if counts[ele] == 1:
       raise ValueError(('NCON error: only one index labelled %i') % (ind))
-    elif sum(pos_ind == ind) > 2:
+    elif counts[ele] > 2:
       raise ValueError(
           ('NCON error: more than two indices labelled %i') % (ind))
-
-    cont_dims = flat_dims[flat_connect == ind]
-    if cont_dims[0] != cont_dims[1]:
+    else:
       raise ValueError(
           ('NCON error: tensor dimension mismatch on index labelled %i: '
-           'dim-%i versus dim-%i') % (ind, cont_dims[0], cont_dims[1]))
+           'dim-%i versus dim-%i') % (ind, dims_first[ele], dims_second[ele]))
 
   return True
 
+
+@functools.lru_cache(maxsize=None)
+def contract_expression(subscripts: str, *shapes: Tuple[int]):
+  """
+  Build a reusable contraction for a network of fixed topology: the optimal
+  pairwise contraction path is found once per set of operand shapes and then
+  reused, so repeated calls (e.g. inside eigs or the TEBD loop) carry no
+  path-finding or index bookkeeping overhead.
+  Args:
+    subscripts: einsum-style specification of the network.
+    shapes: shapes of the operands, in the order they will be passed.
+  Returns:
+    callable: function contracting operands of the given shapes.
+  """
+  path = np.einsum_path(subscripts, *[np.empty(shape) for shape in shapes],
+                        optimize='optimal')[0]
+
+  def expr(*operands):
+    return np.einsum(subscripts, *operands, optimize=path)
+  return expr
+
 """Define fucntions implementing real/imaginary time evolution for MPS with 2-site unit cell (A-B), based on TEBD algorithm."""
 
 # Implementation of time evolution (real or imaginary) for MPS with 2-site unit
@@ -228,7 +259,8 @@ def doTEBD(hamAB: np.ndarray,
            numiter: Optional[int] = 1000,
            midsteps: Optional[int] = 10,
            E0: Optional[float] = 0.0,
-           magz: Optional[np.ndarray] = None):
+           magz: Optional[np.ndarray] = None,
+           dtype: Optional[type] = None):
   """
   Implementation of time evolution (real or imaginary) for MPS with 2-site unit
   cell (A-B), based on TEBD algorithm.
@@ -245,6 +277,11 @@ def doTEBD(hamAB: np.ndarray,
     numiter: number of time-step iterations to take.
     midsteps: number of time-steps between re-orthogonalization of the MPS.
     E0: specify the ground energy (if known).
+    magz: operator whose single-site expectation value is recorded.
+    dtype: if given (e.g. np.float32), run the first 60% of the time-steps at
+      this reduced precision before promoting to double precision. Only
+      supported for imaginary time evolution; Schmidt weights too small to
+      represent at this precision are discarded first.
   Returns:
     np.ndarray: MPS tensor for A-sites;
     np.ndarray: MPS tensor for B-sites;
@@ -252,25 +289,54 @@ def doTEBD(hamAB: np.ndarray,
     np.ndarray: vector sBA of weights for B-A links.
     np.ndarray: two-site reduced density matrix rhoAB for A-B sites
     np.ndarray: two-site reduced density matrix rhoAB for B-A sites
+    np.ndarray: iteration steps at which the energy was recorded.
+    np.ndarray: energy per site at each recorded step.
+    np.ndarray: expectation value of magz at each recorded step (empty if
+      magz is not given).
   """
 
   # exponentiate Hamiltonian
   d = A.shape[1]
-  if evotype == "real":
-    gateAB = expm(1j * tau * hamAB.reshape(d**2, d**2)).reshape(d, d, d, d)
-    gateBA = expm(1j * tau * hamBA.reshape(d**2, d**2)).reshape(d, d, d, d)
-  elif evotype == "imag":
-    gateAB = expm(-tau * hamAB.reshape(d**2, d**2)).reshape(d, d, d, d)
-    gateBA = expm(-tau * hamBA.reshape(d**2, d**2)).reshape(d, d, d, d)
+  gateAB = exp_gate(tau, evotype, np.asarray(hamAB).tobytes(),
+                    np.asarray(hamAB).dtype.str, d)
+  gateBA = exp_gate(tau, evotype, np.asarray(hamBA).tobytes(),
+                    np.asarray(hamBA).dtype.str, d)
+  gates = (gateAB, gateBA)
+
+  # cast the state and gates to reduced precision for the early iterations
+  numiter_switch = 0
+  if dtype is not None:
+    if evotype != "imag":
+      raise ValueError('reduced precision is only supported for imaginary '
+                       'time evolution')
+    A, sAB, B, sBA = trim_MPS(A, sAB, B, sBA, np.finfo(dtype).eps)
+    numiter_switch = int(0.6 * numiter)
+    cdtype = np.result_type(dtype, np.complex64)
+    A, B, gateAB, gateBA = [x.astype(cdtype if np.iscomplexobj(x) else dtype)
+                            for x in (A, B, gateAB, gateBA)]
+    sAB, sBA = sAB.astype(dtype), sBA.astype(dtype)
 
   # initialize environment matrices
   sigBA = np.eye(A.shape[0]) / A.shape[0]
   muAB = np.eye(A.shape[2]) / A.shape[2]
-  time = [] #define time array to store iteration steps
-  sim_E_0 = [] #simulated ground state energy array as time evolved
-  m_z = [] #expectation value of magnetisation along z direction
+
+  # preallocate records, at most one per midsteps plus the final step
+  num_rec = numiter // midsteps + 2
+  rec_dtype = np.result_type(hamAB, hamBA, A, gateAB)
+  time = np.empty(num_rec, dtype=int) #define time array to store iteration steps
+  sim_E_0 = np.empty(num_rec, dtype=rec_dtype) #simulated ground state energy array as time evolved
+  m_z = np.empty(0, dtype=rec_dtype) #expectation value of magnetisation along z direction
+  if magz is not None:
+    m_z = np.empty(num_rec, dtype=np.result_type(rec_dtype, magz))
+  rec = 0
 
   for k in range(numiter + 1):
+    if dtype is not None and k == numiter_switch:
+      # promote back to double precision for the final refinement
+      A, B, sAB, sBA = [x.astype(np.promote_types(x.dtype, np.float64))
+                        for x in (A, B, sAB, sBA)]
+      gateAB, gateBA = gates
+
     if np.mod(k, midsteps) == 0 or (k == numiter):
       """ Bring MPS to normal form """
 
@@ -283,11 +349,9 @@ def doTEBD(hamAB: np.ndarray,
       A, sAB, B = orthog_MPS(sigAB, muAB, A, sAB, B)
 
       # normalize the MPS tensors
-      A_norm = np.sqrt(ncon([np.diag(sBA**2), A, np.conj(A), np.diag(sAB**2)],
-                            [[1, 3], [1, 4, 2], [3, 4, 5], [2, 5]]))
+      A_norm = LA.norm((sBA[:, None, None] * A) * sAB[None, None, :])
       A = A / A_norm
-      B_norm = np.sqrt(ncon([np.diag(sAB**2), B, np.conj(B), np.diag(sBA**2)],
-                            [[1, 3], [1, 4, 2], [3, 4, 5], [2, 5]]))
+      B_norm = LA.norm((sAB[:, None, None] * B) * sBA[None, None, :])
       B = B / B_norm
 
       """ Compute energy and display """
@@ -296,42 +360,98 @@ def doTEBD(hamAB: np.ndarray,
       rhoAB, rhoBA = loc_density_MPS(A, sAB, B, sBA)
 
       # evaluate the energy
-      energyAB = ncon([hamAB, rhoAB], [[1, 2, 3, 4], [1, 2, 3, 4]])
-      energyBA = ncon([hamBA, rhoBA], [[1, 2, 3, 4], [1, 2, 3, 4]])
+      energyAB = np.dot(hamAB.ravel(), rhoAB.ravel())
+      energyBA = np.dot(hamBA.ravel(), rhoBA.ravel())
       energy = 0.5 * (energyAB + energyBA)
 
       chitemp = min(A.shape[0], B.shape[0])
       enDiff = energy - E0
       '''print('iteration: %d of %d, chi: %d, t-step: %f, energy: %f, '
             'energy error: %e' % (k, numiter, chitemp, tau, energy, enDiff))'''
-      time.append(k)
-      sim_E_0.append(energy)
+      time[rec] = k
+      sim_E_0[rec] = energy
 
 
       """ real time evolution to find spin"""
       #evaluate the spin
       if magz is not None:
         mz_t = find_mz(A, sAB, B, sBA, magz)
-        m_z.append(mz_t)
+        m_z[rec] = mz_t
+      rec += 1
 
 
 
     """ Do evolution of MPS through one time-step """
     if k < numiter:
-      # apply gate to A-B link
-      A, sAB, B = apply_gate_MPS(gateAB, A, sAB, B, sBA, chi)
-
-      # apply gate to B-A link
-      B, sBA, A = apply_gate_MPS(gateBA, B, sBA, A, sAB, chi)
+      A, B, sAB, sBA = tebd_step(A, B, sAB, sBA, gateAB, gateBA, chi)
 
 
   rhoAB, rhoBA = loc_density_MPS(A, sAB, B, sBA)
-  return A, B, sAB, sBA, rhoAB, rhoBA, time, sim_E_0, m_z
+  return (A, B, sAB, sBA, rhoAB, rhoBA, time[:rec], sim_E_0[:rec],
+          m_z[:rec])
+
+
+@functools.lru_cache(maxsize=32)
+def exp_gate(tau, evotype, ham_bytes, ham_dtype, d):
+  """ Exponentiate a 2-site Hamiltonian, given by its raw bytes and dtype, into
+  a real (evotype='real') or imaginary (evotype='imag') time-step gate. Gates
+  are cached so that repeated doTEBD calls with the same Hamiltonian and
+  time-step do not redo the exponentiation; the returned array is shared and
+  must not be modified in place."""
+
+  ham = np.frombuffer(ham_bytes, dtype=ham_dtype).reshape(d**2, d**2)
+  if evotype == "real":
+    gate = expm(1j * tau * ham).reshape(d, d, d, d)
+  elif evotype == "imag":
+    gate = expm(-tau * ham).reshape(d, d, d, d)
+  gate.flags.writeable = False
+
+  return gate
+
+
+def trim_MPS(A, sAB, B, sBA, stol):
+  """ Bring the MPS to canonical form and discard the Schmidt weights below
+  stol, together with the matching bond indices of A and B. In canonical form
+  the MPS tensors carry entries of order 1/s, so weights near the precision
+  floor must be removed before the tensors can be cast to lower precision"""
 
+  # bring MPS to canonical form
+  sigBA, sigAB = left_contract_MPS(np.eye(A.shape[0]) / A.shape[0],
+                                   sBA, A, sAB, B)
+  muAB, muBA = right_contract_MPS(np.eye(A.shape[2]) / A.shape[2],
+                                  sBA, A, sAB, B)
+  B, sBA, A = orthog_MPS(sigBA, muBA, B, sBA, A)
+  A, sAB, B = orthog_MPS(sigAB, muAB, A, sAB, B)
 
-def left_contract_MPS(sigBA, sBA, A, sAB, B):
+  # truncate both links to the weights above stol
+  keepAB = sAB > stol
+  keepBA = sBA > stol
+  A = A[keepBA][:, :, keepAB]
+  B = B[keepAB][:, :, keepBA]
+  sAB = sAB[keepAB] / LA.norm(sAB[keepAB])
+  sBA = sBA[keepBA] / LA.norm(sBA[keepBA])
+
+  return A, sAB, B, sBA
+
+
+def tebd_step(A, B, sAB, sBA, gateAB, gateBA, chi):
+  """ Evolve the MPS through one time-step by applying the gates to the A-B
+  and then the B-A link, truncating back to dimension chi"""
+
+  # apply gate to A-B link
+  A, sAB, B = apply_gate_MPS(gateAB, A, sAB, B, sBA, chi)
+
+  # apply gate to B-A link
+  B, sBA, A = apply_gate_MPS(gateBA, B, sBA, A, sAB, chi)
+
+  return A, B, sAB, sBA
+
+
+def left_contract_MPS(sigBA, sBA, A, sAB, B, dense_dim=64):
   """ Contract an infinite 2-site unit cell from the left for the environment
-  density matrices sigBA (B-A link) and sigAB (A-B link)"""
+  density matrices sigBA (B-A link) and sigAB (A-B link). Transfer matrices
+  of dimension up to dense_dim are diagonalized directly rather than with
+  eigs"""
 
   # initialize the starting vector
   chiBA = A.shape[0]
@@ -340,18 +460,45 @@ def left_contract_MPS(sigBA, sBA, A, sAB, B):
   else:
     v0 = (np.eye(chiBA) / chiBA).reshape(chiBA**2)
 
-  # define network for transfer operator contract
-  tensors = [np.diag(sBA), np.diag(sBA), A, A.conj(), np.diag(sAB),
-             np.diag(sAB), B, B.conj()]
-  labels = [[1, 2], [1, 3], [2, 4], [3, 5, 6], [4, 5, 7], [6, 8], [7, 9],
-            [8, 10, -1], [9, 10, -2]]
-
-  # define function for boundary contraction and pass to eigs
-  def left_iter(sigBA):
-    return ncon([sigBA.reshape([chiBA, chiBA]), *tensors],
-                labels).reshape([chiBA**2, 1])
-  Dtemp, sigBA = eigs(LinearOperator((chiBA**2, chiBA**2), matvec=left_iter),
-                      k=1, which='LM', v0=v0, tol=1e-10)
+  # define network for transfer operator contract, with the weights (which
+  # are constant over the eigensolve) absorbed into A once
+  A_l = (sBA[:, None, None] * A) * sAB[None, None, :]
+  tensors = [A_l, A_l.conj(), B, B.conj()]
+  shapes = [tensor.shape for tensor in tensors]
+
+  if chiBA**2 <= dense_dim:
+    # small transfer operator: build it explicitly and take the dominant
+    # eigenvector directly, avoiding the ARPACK overhead
+    transfer = contract_expression('ceh,dei,hjy,ijz->yzcd', *shapes)
+    Dtemp, utemp = LA.eig(transfer(*tensors).reshape(chiBA**2, chiBA**2))
+    sigBA = utemp[:, np.argmax(np.abs(Dtemp))]
+  else:
+    # contract the transfer operator as a fixed sequence of matrix products
+    # into buffers allocated once for the whole eigensolve
+    d = A.shape[1]
+    chiAB = A.shape[2]
+    A_mat = A_l.reshape(chiBA, d * chiAB)
+    Ac_mat = A_l.conj().reshape(chiBA * d, chiAB)
+    B_mat = B.reshape(chiAB, d * chiBA)
+    Bc_mat = B.conj().reshape(chiAB * d, chiBA)
+    dtype = np.result_type(A_l, B)
+    temp1 = np.empty((chiBA, d * chiAB), dtype=dtype)
+    temp2 = np.empty((chiAB, chiAB), dtype=dtype)
+    temp3 = np.empty((chiAB, d * chiBA), dtype=dtype)
+    out = np.empty((chiBA, chiBA), dtype=dtype)
+
+    # define function for boundary contraction and pass to eigs. The transfer
+    # operator is not Hermitian (only its fixed point is), so eigsh does not
+    # apply; giving the dtype lets ARPACK use a real Krylov space for real A
+    def left_iter(sigBA):
+      np.matmul(sigBA.reshape(chiBA, chiBA).T, A_mat, out=temp1)
+      np.matmul(temp1.reshape(chiBA * d, chiAB).T, Ac_mat, out=temp2)
+      np.matmul(temp2.T, B_mat, out=temp3)
+      np.matmul(temp3.reshape(chiAB * d, chiBA).T, Bc_mat, out=out)
+      return out.reshape([chiBA**2, 1])
+    Dtemp, sigBA = eigs(LinearOperator((chiBA**2, chiBA**2),
+                                       matvec=left_iter, dtype=dtype),
+                        k=1, which='LM', v0=v0, tol=1e-10)
 
   # normalize the environment density matrix sigBA
   if np.isrealobj(A):
@@ -361,16 +508,19 @@ def left_contract_MPS(sigBA, sBA, A, sAB, B):
   sigBA = sigBA / np.trace(sigBA)
 
   # compute density matric sigAB for A-B link
-  sigAB = ncon([sigBA, np.diag(sBA), np.diag(sBA), A, np.conj(A)],
-               [[1, 2], [1, 3], [2, 4], [3, 5, -1], [4, 5, -2]])
+  A_w = sBA[:, None, None] * A
+  sigAB = ncon([sigBA, A_w, np.conj(A_w)], [[1, 2], [1, 3, -1], [2, 3, -2]],
+               check_network=False)
   sigAB = sigAB / np.trace(sigAB)
 
   return sigBA, sigAB
 
 
-def right_contract_MPS(muAB, sBA, A, sAB, B):
+def right_contract_MPS(muAB, sBA, A, sAB, B, dense_dim=64):
   """ Contract an infinite 2-site unit cell from the right for the environment
-  density matrices muAB (A-B link) and muBA (B-A link)"""
+  density matrices muAB (A-B link) and muBA (B-A link). Transfer matrices
+  of dimension up to dense_dim are diagonalized directly rather than with
+  eigs"""
 
   # initialize the starting vector
   chiAB = A.shape[2]
@@ -379,18 +529,45 @@ def right_contract_MPS(muAB, sBA, A, sAB, B):
   else:
     v0 = (np.eye(chiAB) / chiAB).reshape(chiAB**2)
 
-  # define network for transfer operator contract
-  tensors = [np.diag(sAB), np.diag(sAB), A, A.conj(), np.diag(sBA),
-             np.diag(sBA), B, B.conj()]
-  labels = [[1, 2], [3, 1], [5, 2], [6, 4, 3], [7, 4, 5], [8, 6], [10, 7],
-            [-1, 9, 8], [-2, 9, 10]]
-
-  # define function for boundary contraction and pass to eigs
-  def right_iter(muAB):
-    return ncon([muAB.reshape([chiAB, chiAB]), *tensors],
-                labels).reshape([chiAB**2, 1])
-  Dtemp, muAB = eigs(LinearOperator((chiAB**2, chiAB**2), matvec=right_iter),
-                     k=1, which='LM', v0=v0, tol=1e-10)
+  # define network for transfer operator contract, with the weights (which
+  # are constant over the eigensolve) absorbed into A once
+  A_r = (sBA[:, None, None] * A) * sAB[None, None, :]
+  tensors = [A_r, A_r.conj(), B, B.conj()]
+  shapes = [tensor.shape for tensor in tensors]
+
+  if chiAB**2 <= dense_dim:
+    # small transfer operator: build it explicitly and take the dominant
+    # eigenvector directly, avoiding the ARPACK overhead
+    transfer = contract_expression('hda,jdb,yih,zij->yzab', *shapes)
+    Dtemp, utemp = LA.eig(transfer(*tensors).reshape(chiAB**2, chiAB**2))
+    muAB = utemp[:, np.argmax(np.abs(Dtemp))]
+  else:
+    # contract the transfer operator as a fixed sequence of matrix products
+    # into buffers allocated once for the whole eigensolve
+    d = A.shape[1]
+    chiBA = A.shape[0]
+    A_mat = A_r.reshape(chiBA * d, chiAB)
+    Ac_mat = A_r.conj().reshape(chiBA, d * chiAB)
+    B_mat = B.reshape(chiAB * d, chiBA)
+    Bc_mat = B.conj().reshape(chiAB, d * chiBA)
+    dtype = np.result_type(A_r, B)
+    temp1 = np.empty((chiBA * d, chiAB), dtype=dtype)
+    temp2 = np.empty((chiBA, chiBA), dtype=dtype)
+    temp3 = np.empty((chiAB * d, chiBA), dtype=dtype)
+    out = np.empty((chiAB, chiAB), dtype=dtype)
+
+    # define function for boundary contraction and pass to eigs. The transfer
+    # operator is not Hermitian (only its fixed point is), so eigsh does not
+    # apply; giving the dtype lets ARPACK use a real Krylov space for real A
+    def right_iter(muAB):
+      np.matmul(A_mat, muAB.reshape(chiAB, chiAB), out=temp1)
+      np.matmul(temp1.reshape(chiBA, d * chiAB), Ac_mat.T, out=temp2)
+      np.matmul(B_mat, temp2, out=temp3)
+      np.matmul(temp3.reshape(chiAB, d * chiBA), Bc_mat.T, out=out)
+      return out.reshape([chiAB**2, 1])
+    Dtemp, muAB = eigs(LinearOperator((chiAB**2, chiAB**2),
+                                      matvec=right_iter, dtype=dtype),
+                       k=1, which='LM', v0=v0, tol=1e-10)
 
   # normalize the environment density matrix muAB
   if np.isrealobj(A):
@@ -400,8 +577,9 @@ def right_contract_MPS(muAB, sBA, A, sAB, B):
   muAB = muAB / np.trace(muAB)
 
   # compute density matrix muBA for B-A link
-  muBA = ncon([muAB, np.diag(sAB), np.diag(sAB), A, A.conj()],
-              [[1, 2], [3, 1], [5, 2], [-1, 4, 3], [-2, 4, 5]])
+  A_w = A * sAB[None, None, :]
+  muBA = ncon([muAB, A_w, A_w.conj()], [[1, 2], [-1, 3, 1], [-2, 3, 2]],
+              check_network=False)
   muBA = muBA / np.trace(muBA)
 
   return muAB, muBA
@@ -410,29 +588,30 @@ def right_contract_MPS(muAB, sBA, A, sAB, B):
 def orthog_MPS(sigBA, muBA, B, sBA, A, dtol=1e-12):
   """ set the MPS gauge across B-A link to the canonical form """
 
-  # diagonalize left environment matrix
+  # diagonalize left environment matrix, keeping eigenvalues above dtol in
+  # descending order
   dtemp, utemp = LA.eigh(sigBA)
-  chitemp = sum(dtemp > dtol)
-  DL = dtemp[range(-1, -chitemp - 1, -1)]
-  UL = utemp[:, range(-1, -chitemp - 1, -1)]
+  chitemp = np.sum(dtemp > dtol)
+  DL = dtemp[::-1][:chitemp]
+  UL = np.ascontiguousarray(utemp[:, ::-1][:, :chitemp])
 
   # diagonalize right environment matrix
   dtemp, utemp = LA.eigh(muBA)
-  chitemp = sum(dtemp > dtol)
-  DR = dtemp[range(-1, -chitemp - 1, -1)]
-  UR = utemp[:, range(-1, -chitemp - 1, -1)]
+  chitemp = np.sum(dtemp > dtol)
+  DR = dtemp[::-1][:chitemp]
+  UR = np.ascontiguousarray(utemp[:, ::-1][:, :chitemp])
 
   # compute new weights for B-A link
-  weighted_mat = (np.diag(np.sqrt(DL)) @ UL.T @ np.diag(sBA)
-                  @ UR @ np.diag(np.sqrt(DR)))
+  weighted_mat = ((np.sqrt(DL)[:, None] * UL.T) * sBA[None, :]
+                  @ (UR * np.sqrt(DR)[None, :]))
   UBA, stemp, VhBA = LA.svd(weighted_mat, full_matrices=False)
   sBA = stemp / LA.norm(stemp)
 
   # build x,y gauge change matrices, implement gauge change on A and B
-  x = np.conj(UL) @ np.diag(1 / np.sqrt(DL)) @ UBA
-  y = np.conj(UR) @ np.diag(1 / np.sqrt(DR)) @ VhBA.T
-  A = ncon([y, A], [[1, -1], [1, -2, -3]])
-  B = ncon([B, x], [[-1, -2, 2], [2, -3]])
+  x = (np.conj(UL) / np.sqrt(DL)[None, :]) @ UBA
+  y = (np.conj(UR) / np.sqrt(DR)[None, :]) @ VhBA.T
+  A = ncon([y, A], [[1, -1], [1, -2, -3]], check_network=False)
+  B = ncon([B, x], [[-1, -2, 2], [2, -3]], check_network=False)
 
   return B, sBA, A
 
@@ -447,23 +626,41 @@ def apply_gate_MPS(gateAB, A, sAB, B, sBA, chi, stol=1e-7):
   # contract gate into the MPS, then deompose composite tensor with SVD
   d = A.shape[1]
   chiBA = sBA_trim.shape[0]
-  tensors = [np.diag(sBA_trim), A, np.diag(sAB), B, np.diag(sBA_trim), gateAB]
-  connects = [[-1, 1], [1, 5, 2], [2, 4], [4, 6, 3], [3, -4], [-2, -3, 5, 6]]
+  tensors = [(sBA_trim[:, None, None] * A) * sAB[None, None, :],
+             B * sBA_trim[None, None, :], gateAB]
+  theta = contract_expression('wed,dfz,xyef->wxyz',
+                              *[tensor.shape for tensor in tensors])
   nshape = [d * chiBA, d * chiBA]
-  utemp, stemp, vhtemp = LA.svd(ncon(tensors, connects).reshape(nshape),
-                                full_matrices=False)
+
+  # call LAPACK gesdd directly on the (Fortran-ordered) transpose of the
+  # composite matrix, so that it can be decomposed in place without a copy
+  theta_mat = np.ascontiguousarray(theta(*tensors).reshape(nshape)).T
+  gesdd, = get_lapack_funcs(('gesdd',), (theta_mat,))
+  vtemp, stemp, uhtemp, info = gesdd(theta_mat, compute_uv=1,
+                                     full_matrices=0, overwrite_a=1)
+  if info > 0:
+    raise LA.LinAlgError('SVD did not converge')
+  utemp, vhtemp = uhtemp.T, vtemp.T
+
+  return truncate_MPS(utemp, stemp, vhtemp, sBA_trim, chi, d)
+
+
+def truncate_MPS(utemp, stemp, vhtemp, sBA_trim, chi, d):
+  """ Truncate the SVD of a composite A-B tensor to dimension chi and remove
+  the B-A environment weights sBA_trim to form new MPS tensors A and B"""
 
   # truncate to reduced dimension
+  chiBA = sBA_trim.shape[0]
   chitemp = min(chi, len(stemp))
-  utemp = utemp[:, range(chitemp)].reshape(sBA_trim.shape[0], d * chitemp)
-  vhtemp = vhtemp[range(chitemp), :].reshape(chitemp * d, chiBA)
+  utemp = utemp[:, :chitemp].reshape(chiBA, d * chitemp)
+  vhtemp = vhtemp[:chitemp, :].reshape(chitemp * d, chiBA)
 
   # remove environment weights to form new MPS tensors A and B
-  A = (np.diag(1 / sBA_trim) @ utemp).reshape(sBA_trim.shape[0], d, chitemp)
-  B = (vhtemp @ np.diag(1 / sBA_trim)).reshape(chitemp, d, chiBA)
+  A = ((1 / sBA_trim)[:, None] * utemp).reshape(chiBA, d, chitemp)
+  B = (vhtemp * (1 / sBA_trim)[None, :]).reshape(chitemp, d, chiBA)
 
   # new weights
-  sAB = stemp[range(chitemp)] / LA.norm(stemp[range(chitemp)])
+  sAB = stemp[:chitemp] / LA.norm(stemp[:chitemp])
 
   return A, sAB, B
 
@@ -472,51 +669,44 @@ def loc_density_MPS(A, sAB, B, sBA):
   """ Compute the local reduced density matrices from an MPS (assumend to be
   in canonical form)."""
 
-  # recast singular weights into a matrix
-  mAB = np.diag(sAB)
-  mBA = np.diag(sBA)
-
-  # contract MPS for local reduced density matrix (A-B)
-  tensors = [np.diag(sBA**2), A, A.conj(), mAB, mAB, B, B.conj(),
-             np.diag(sBA**2)]
-  connects = [[3, 4], [3, -3, 1], [4, -1, 2], [1, 7], [2, 8], [7, -4, 5],
-              [8, -2, 6], [5, 6]]
-  rhoAB = ncon(tensors, connects)
+  # contract MPS for local reduced density matrix (A-B), with the weights
+  # absorbed into the MPS tensors
+  A_w = (sBA[:, None, None] * A) * sAB[None, None, :]
+  B_w = B * sBA[None, None, :]
+  tensors = [A_w, A_w.conj(), B_w, B_w.conj()]
+  subscripts = 'cya,cwb,aze,bxe->wxyz'
+  rhoAB = contract_expression(subscripts,
+                              *[tensor.shape for tensor in tensors])(*tensors)
 
   # contract MPS for local reduced density matrix (B-A)
-  tensors = [np.diag(sAB**2), B, B.conj(), mBA, mBA, A, A.conj(),
-             np.diag(sAB**2)]
-  connects = [[3, 4], [3, -3, 1], [4, -1, 2], [1, 7], [2, 8], [7, -4, 5],
-              [8, -2, 6], [5, 6]]
-  rhoBA = ncon(tensors, connects)
+  B_w = (sAB[:, None, None] * B) * sBA[None, None, :]
+  A_w = A * sAB[None, None, :]
+  tensors = [B_w, B_w.conj(), A_w, A_w.conj()]
+  rhoBA = contract_expression(subscripts,
+                              *[tensor.shape for tensor in tensors])(*tensors)
 
   return rhoAB, rhoBA
 
 
 def single_density(A, sAB, B, sBA):
-  mAB = np.diag(sAB)
-  mBA = np.diag(sBA)
-
-  tensors = [(mBA @ mBA), A, (mAB @ mAB), A.conj()]
-  #tensors = [np.diag(sBA**2), A, np.diag(sAB**2), A.conj()]
-  labels = [[1 ,2], [2, -2, 3], [3, 4], [1, -1, 4]]
-  '''print('chi = %d, d = %d' %(chi, d))
-  print('dim of sAB is ', np.shape(sAB))
-  print('dim of mAB is ', np.shape(mAB))
-  print('dim of (mAB@mAB) is', np.shape(mAB @ mAB))
-  print('dim of A is', np.shape(A))'''
-  rhoA = ncon(tensors, labels)
-
-  tensors = [(mAB @ mAB), B, (mBA @ mBA), B.conj()]
-  #tensors = [np.diag(sAB**2), B, np.diag(sBA**2), B.conj()]
-  rhoB = ncon(tensors, labels)
+  A_w = (sBA[:, None, None] * A) * sAB[None, None, :]
+  B_w = (sAB[:, None, None] * B) * sBA[None, None, :]
+
+  tensors = [A_w, A_w.conj()]
+  subscripts = 'ayc,axc->xy'
+  rhoA = contract_expression(subscripts,
+                             *[tensor.shape for tensor in tensors])(*tensors)
+
+  tensors = [B_w, B_w.conj()]
+  rhoB = contract_expression(subscripts,
+                             *[tensor.shape for tensor in tensors])(*tensors)
 
   return rhoA, rhoB
 
 def find_mz(A, sAB, B, sBA, mz):
     rhoA, rhoB = single_density(A, sAB, B, sBA)
-    mzA = ncon([mz, rhoA], [[1, 2], [1, 2]])
-    mzB = ncon([mz, rhoB], [[1, 2], [1, 2]])
+    mzA = np.dot(mz.ravel(), rhoA.ravel())
+    mzB = np.dot(mz.ravel(), rhoB.ravel())
     mz_t = 0.5 * (mzA + mzB)
     return mz_t
 
@@ -545,90 +735,200 @@ evotype = "imag"  # real or imaginary time evolution
 E0 = -4 / np.pi  # specify exact ground energy (not known, just plug in random number, since this does not affect simulation performed here)
 tau = 0.1  # timestep
 midsteps = int(1 / tau)  # timesteps between MPS re-orthogonalization
+numchunks = 4  # number of warm-started sub-ranges of h, fixed so results do not depend on the machine
 
 # define Hamiltonian (quantum XX model)
 sX = np.array([[0, 1], [1, 0]])
 sY = np.array([[0, -1j], [1j, 0]])
 sZ = np.array([[1, 0], [0, -1]])
 
+# field-independent Hamiltonian terms, built once for all field values
+HXX = np.kron(sX, sX).astype(np.float64)
+HZI = np.kron(sZ, np.eye(2)).astype(np.float64)
+
+
+def warm_ground_state(hamAB, hamBA, A, B, sAB, sBA, chi, tau, evotype,
+                      midsteps, E0, block, max_iter, tol=1e-6, magz=None):
+  """ Imaginary time evolve a warm-started MPS in blocks of block timesteps
+  until the energy (and the expectation value of magz, if given) changes by
+  less than tol between consecutive blocks, or max_iter timesteps have been
+  taken. Returns the evolved MPS tensors and weights and the final energy """
+  energy = mz = None
+  for _ in range(max(1, max_iter // block)):
+    A, B, sAB, sBA, _, _, _, E_0, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+      tau, evotype=evotype, numiter=block, midsteps=midsteps, E0=E0)
+    mz_new = find_mz(A, sAB, B, sBA, magz) if magz is not None else 0.0
+    converged = (energy is not None and abs(E_0[-1] - energy) < tol
+                 and abs(mz_new - mz) < tol)
+    energy, mz = E_0[-1], mz_new
+    if converged:
+      break
+  return A, B, sAB, sBA, energy
+
+
+def ground_energies(hs, chi, numiter, tau, evotype, midsteps, E0, seed):
+  """ Imaginary time evolve to the ground state at each field in hs, returning
+  a list of the simulated and the exact ground energy per site. The first
+  field starts from a seeded random MPS; since the ground state varies smoothly
+  with h, each later field is warm-started from the previous ground state and
+  evolved in blocks until its energy converges, with numiter as a cap """
+  rng = np.random.default_rng(seed)
 
-
-
-""" Imaginary time evolution with TEBD """
-# set bond dimensions and simulation options
-chi = 16  # bond dimension
-tau = 0.1  # timestep
-# run TEBD routine
-hz = np.linspace(0.0, 5.0, 10)
-theory =[]
-sim_e = []
-error4 = []
-error16 = []
-
-
-#varying chi value, and also checking the accuracy of the simulation in finding ground state energy
-for h in hz:
-  # initialize tensors
-  d = hamAB.shape[0]
-  sAB = np.ones(chi) / np.sqrt(chi)
-  sBA = np.ones(chi) / np.sqrt(chi)
-  A = np.random.rand(chi, d, chi)
-  B = np.random.rand(chi, d, chi)
-  hamAB = (np.real(np.kron(sX, sX) + h*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
-  hamBA = hamAB
-  _, _, _, _, _, _, _, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-  tebd_e = E_0[-1]
-  expected = theory_e0(h)
-  percent_err = (tebd_e - expected)*100/expected
-  sim_e.append(tebd_e)
-  theory.append(expected)
-  error16.append(percent_err)
-
-chi = 4
-for h in hz:
   # initialize tensors
-  d = hamAB.shape[0]
-  sAB = np.ones(chi) / np.sqrt(chi)
-  sBA = np.ones(chi) / np.sqrt(chi)
-  A = np.random.rand(chi, d, chi)
-  B = np.random.rand(chi, d, chi)
-  hamAB = (np.real(np.kron(sX, sX) + h*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
-  hamBA = hamAB
-  _, _, _, _, _, _, _, E_0= doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-  tebd_e = E_0[-1]
-  expected = theory_e0(h)
-  percent_err = (tebd_e - expected)*100/expected
-  sim_e.append(tebd_e)
-  theory.append(expected)
-  error4.append(percent_err)
-
-
-plt.plot(hz, error4, '.', label = '$\chi = 4$')
-plt.plot(hz, error16, '.', label = '$\chi = 16$')
-plt.xlabel('$h_z$')
-plt.ylabel('Error, in %')
-plt.title('Percentage error in ground state energy, timestep = 0.1')
-plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
-plt.show()
-
-""" Real time evolution to find mz(t) """
-# set bond dimensions and simulation options
-chi = 16  # bond dimension
-# run TEBD routine
-hz = np.linspace(0.0, 5.0, 40)
-dh = 0.125
-sim_mz_gs = []
-sim_mz_realT = []
-
-
-""" finding average spin by finding expectaion value of ground state found by imaginary time evolution """
-
-#case 1: evolve system to ground state then examiine the real time dynamics of system
-for h in hz:
+  d = sX.shape[0]
+  sAB = np.full(chi, 1 / np.sqrt(chi))
+  sBA = np.full(chi, 1 / np.sqrt(chi))
+  A = rng.standard_normal((chi, d, chi))
+  B = rng.standard_normal((chi, d, chi))
+
+  energies = []
+  for k, h in enumerate(hs):
+    hamAB = (HXX + h*HZI).reshape(2, 2, 2, 2)
+    hamBA = hamAB
+    if k == 0:
+      A, B, sAB, sBA, _, _, _, E_0, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA,
+        chi, tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+      energy = E_0[-1]
+    else:
+      A, B, sAB, sBA, energy = warm_ground_state(hamAB, hamBA, A, B, sAB, sBA,
+        chi, tau, evotype, midsteps, E0, block=numiter // 6, max_iter=numiter)
+    energies.append((energy, theory_e0(h)))
+  return energies
+
+
+# the driver scripts below only run when this file is executed directly, so
+# that worker processes started by Pool (which may re-import this module) do
+# not re-run the sweeps
+if __name__ == '__main__':
+  """ Imaginary time evolution with TEBD """
+  # set bond dimensions and simulation options
+  chi = 16  # bond dimension
+  tau = 0.1  # timestep
+  # run TEBD routine
+  hz = np.linspace(0.0, 5.0, 10)
+  theory =[]
+  sim_e = []
+  error4 = []
+  error16 = []
+
+
+  #varying chi value, and also checking the accuracy of the simulation in finding ground state energy
+  #the sweep is split into monotone sub-ranges of h, each warm-started along its
+  #range and spread over worker processes
+  hz_chunks = np.array_split(hz, min(len(hz), numchunks))
+  numworkers = min(len(hz_chunks), os.cpu_count() or 1)
+  with Pool(processes=numworkers) as pool:
+    results = pool.starmap(ground_energies,
+                           [(hs, chi, numiter, tau, evotype, midsteps, E0, seed)
+                            for seed, hs in enumerate(hz_chunks)])
+  for tebd_e, expected in [energy for chunk in results for energy in chunk]:
+    percent_err = (tebd_e - expected)*100/expected
+    sim_e.append(tebd_e)
+    theory.append(expected)
+    error16.append(percent_err)
+
+  chi = 4
+  with Pool(processes=numworkers) as pool:
+    results = pool.starmap(ground_energies,
+                           [(hs, chi, numiter, tau, evotype, midsteps, E0, seed)
+                            for seed, hs in enumerate(hz_chunks)])
+  for tebd_e, expected in [energy for chunk in results for energy in chunk]:
+    percent_err = (tebd_e - expected)*100/expected
+    sim_e.append(tebd_e)
+    theory.append(expected)
+    error4.append(percent_err)
+
+
+  plt.plot(hz, error4, '.', label = '$\chi = 4$')
+  plt.plot(hz, error16, '.', label = '$\chi = 16$')
+  plt.xlabel('$h_z$')
+  plt.ylabel('Error, in %')
+  plt.title('Percentage error in ground state energy, timestep = 0.1')
+  plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
+  plt.show()
+
+  """ Real time evolution to find mz(t) """
+  # set bond dimensions and simulation options
+  chi = 16  # bond dimension
+  # run TEBD routine
+  hz = np.linspace(0.0, 5.0, 40)
+  dh = 0.125
+  sim_mz_gs = []
+  sim_mz_realT = []
+
+
+  """ finding average spin by finding expectaion value of ground state found by imaginary time evolution """
+
+  #case 1: evolve system to ground state then examiine the real time dynamics of system
+  #initialize tensors once; each later h is warm-started from the previous ground state
+  rng = np.random.default_rng(0)
+  d = sX.shape[0]
+  sAB = np.full(chi, 1 / np.sqrt(chi))
+  sBA = np.full(chi, 1 / np.sqrt(chi))
+  A = rng.standard_normal((chi, d, chi))
+  B = rng.standard_normal((chi, d, chi))
+  for h in hz:
+    hamAB = (-HXX - h*HZI).reshape(2, 2, 2, 2)
+    hamBA = hamAB
+    mag_z = sZ
+    if h == hz[0]:
+      A1, B1, sAB1, sBA1, _, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+        tau, evotype=evotype, numiter=450, midsteps=midsteps, E0=E0, magz = None)
+    else:
+      #warm start: evolve in blocks until energy and m_z converge, at most 450 steps
+      A1, B1, sAB1, sBA1, _ = warm_ground_state(hamAB, hamBA, A, B, sAB, sBA, chi,
+        tau, evotype, midsteps, E0, block=150, max_iter=450, magz=mag_z)
+    A, B, sAB, sBA = A1, B1, sAB1, sBA1
+    mz = find_mz(A1, sAB1, B1, sBA1, mag_z)
+    sim_mz_gs.append(mz)
+    A2, B2, sAB2, sBA2, _, _, _, _, real_mz_sim = doTEBD(hamAB, hamBA, A1, B1, sAB1, sBA1, chi,
+      tau, evotype="real", numiter=100, midsteps=midsteps, E0=E0, magz = mag_z)
+    realT_mz = real_mz_sim[-1]
+    sim_mz_realT.append(realT_mz)
+
+  plt.plot(time, real_mz_sim)
+  plt.ylabel('$m_z$')
+  plt.xlabel('time')
+  plt.title('Real time evolution of average magnetisation, $\chi$ = %d, h = %f'%(chi, h1))
+  plt.show()
+
+
+  #case 2: evolve system to ground state then find the average spin of the ground state
+  #initialize tensors once; each later h is warm-started from the previous ground state
+  rng = np.random.default_rng(0)
+  d = sX.shape[0]
+  sAB = np.full(chi, 1 / np.sqrt(chi))
+  sBA = np.full(chi, 1 / np.sqrt(chi))
+  A = rng.standard_normal((chi, d, chi))
+  B = rng.standard_normal((chi, d, chi))
+  for h in hz:
+    hamAB = (-HXX - h*HZI).reshape(2, 2, 2, 2)
+    hamBA = hamAB
+    mag_z = sZ
+    if h == hz[0]:
+      A1, B1, sAB1, sBA1, _, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+        tau, evotype=evotype, numiter=450, midsteps=midsteps, E0=E0, magz = sZ)
+    else:
+      #warm start: evolve in blocks until energy and m_z converge, at most 450 steps
+      A1, B1, sAB1, sBA1, _ = warm_ground_state(hamAB, hamBA, A, B, sAB, sBA, chi,
+        tau, evotype, midsteps, E0, block=150, max_iter=450, magz=mag_z)
+    A, B, sAB, sBA = A1, B1, sAB1, sBA1
+    mz = find_mz(A1, sAB1, B1, sBA1, mag_z)
+    sim_mz_gs.append(mz)
+
+  plt.plot(hz, sim_mz_gs, '+', label = '$m_z$')
+  plt.plot(hz, np.gradient(sim_mz_gs, dh), '.', label = '$\partial m_z / \partial h$')
+  plt.ylabel('$m_z$')
+  plt.xlabel('$h_z$')
+  plt.title('Average magnetisation vs B field, $\chi$ = %d'%chi)
+  plt.legend(loc = 'lower right', bbox_to_anchor = (0.9, 0.1))
+  plt.show()
+
+
+  #case 3: first evolve system at one field to ground state, then change the B field and investigate the real time dynamics
   # initialize tensors
-  hamAB = (np.real(-np.kron(sX, sX) - h*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
+  h1 = 9.0
+  hamAB = (-HXX - h1*HZI).reshape(2, 2, 2, 2)
   hamBA = hamAB
   d = hamAB.shape[0]
   sAB = np.ones(chi) / np.sqrt(chi)
@@ -637,152 +937,100 @@ for h in hz:
   B = np.random.rand(chi, d, chi)
   mag_z = sZ
   A1, B1, sAB1, sBA1, _, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=450, midsteps=midsteps, E0=E0, magz = None)
-  mz = find_mz(A1, sAB1, B1, sBA1, mag_z)
-  sim_mz_gs.append(mz)
-  A2, B2, sAB2, sBA2, _, _, _, _, real_mz_sim = doTEBD(hamAB, hamBA, A1, B1, sAB1, sBA1, chi,
-    tau, evotype="real", numiter=100, midsteps=midsteps, E0=E0, magz = mag_z)
-  realT_mz = real_mz_sim[-1]
-  sim_mz_realT.append(realT_mz)
-
-plt.plot(time, real_mz_sim)
-plt.ylabel('$m_z$')
-plt.xlabel('time')
-plt.title('Real time evolution of average magnetisation, $\chi$ = %d, h = %f'%(chi, h1))
-plt.show()
-
-
-#case 2: evolve system to ground state then find the average spin of the ground state
-for h in hz:
-  # initialize tensors
-  hamAB = (np.real(-np.kron(sX, sX) - h*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
+    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+
+  h2 = 0.8
+  hamAB2 = (-HXX - h2*HZI).reshape(2, 2, 2, 2)
+  hamBA2 = hamAB2
+  _, _, _, _, _, _, time, _, real_mz_sim = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+    tau, evotype='real', numiter=numiter, midsteps=midsteps, E0=E0,magz = sZ)
+
+  plt.plot(time, real_mz_sim)
+  plt.ylabel('$m_z$')
+  plt.xlabel('time')
+  plt.title('Real time evolution of average magnetisation, $\chi$ = %d, h = %f'%(chi, h1))
+  plt.show()
+
+
+  #checking: (done before all above cases) checking the contraction indexing of single_density function defined above
+  h = 0.9
+  hamAB = (HXX + h*HZI).reshape(2, 2, 2, 2)
   hamBA = hamAB
   d = hamAB.shape[0]
   sAB = np.ones(chi) / np.sqrt(chi)
   sBA = np.ones(chi) / np.sqrt(chi)
   A = np.random.rand(chi, d, chi)
   B = np.random.rand(chi, d, chi)
-  mag_z = sZ
-  A1, B1, sAB1, sBA1, _, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=450, midsteps=midsteps, E0=E0, magz = sZ)
-  mz = find_mz(A1, sAB1, B1, sBA1, mag_z)
-  sim_mz_gs.append(mz)
-
-plt.plot(hz, sim_mz_gs, '+', label = '$m_z$')
-plt.plot(hz, np.gradient(sim_mz_gs, dh), '.', label = '$\partial m_z / \partial h$')
-plt.ylabel('$m_z$')
-plt.xlabel('$h_z$')
-plt.title('Average magnetisation vs B field, $\chi$ = %d'%chi)
-plt.legend(loc = 'lower right', bbox_to_anchor = (0.9, 0.1))
-plt.show()
-
-
-#case 3: first evolve system at one field to ground state, then change the B field and investigate the real time dynamics
-# initialize tensors
-h1 = 9.0
-hamAB = (np.real(-np.kron(sX, sX) - h1*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
-hamBA = hamAB
-d = hamAB.shape[0]
-sAB = np.ones(chi) / np.sqrt(chi)
-sBA = np.ones(chi) / np.sqrt(chi)
-A = np.random.rand(chi, d, chi)
-B = np.random.rand(chi, d, chi)
-mag_z = sZ
-A1, B1, sAB1, sBA1, _, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-  tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-
-h2 = 0.8
-hamAB2 = (np.real(-np.kron(sX, sX) - h2*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
-hamBA2 = hamAB2
-_, _, _, _, _, _, time, _, real_mz_sim = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-  tau, evotype='real', numiter=numiter, midsteps=midsteps, E0=E0,magz = sZ)
-
-plt.plot(time, real_mz_sim)
-plt.ylabel('$m_z$')
-plt.xlabel('time')
-plt.title('Real time evolution of average magnetisation, $\chi$ = %d, h = %f'%(chi, h1))
-plt.show()
-
-
-#checking: (done before all above cases) checking the contraction indexing of single_density function defined above
-h = 0.9
-hamAB = (np.real(np.kron(sX, sX) + h*np.kron(sZ, np.eye(2)))).reshape(2, 2, 2, 2)
-hamBA = hamAB
-d = hamAB.shape[0]
-sAB = np.ones(chi) / np.sqrt(chi)
-sBA = np.ones(chi) / np.sqrt(chi)
-A = np.random.rand(chi, d, chi)
-B = np.random.rand(chi, d, chi)
-A1, B1, sAB1, sBA1, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-print('dim of A is', np.shape(A1))
-print('dim of B is', np.shape(B1))
-print('dim of sAB is', np.shape(sAB1))
-print('dim of sBA is', np.shape(sBA1))
-print(find_mz(A1, sAB1, B1, sBA1, sZ))
-print('h =', h)
-
-
-#for plotting some of the cases above
-plt.plot(time, mz_t, label = '$m_z$')
-plt.ylabel('$m_z$')
-plt.xlabel('time')
-plt.title('Average magnetisation vs time, $\chi$ = %d'%chi)
-
-
-plt.plot(hz, sim_mz_gs, label = 'From ground state, by imaginary time evolution ')
-plt.plot(hz, sim_mz_realT, '+', label = 'From real time evolution of system')
-plt.ylabel('$m_z$')
-plt.xlabel('$h_z$')
-plt.title('Average magnetisation vs B field, $\chi$ = %d'%chi)
-plt.legend(loc = 'lower right', bbox_to_anchor = (0.9, 0.1))
-plt.show()
-
-A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-
-
-# continute running TEBD routine with reduced timestep
-tau = 0.01
-numiter = 2000
-midsteps = 100
-A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-
-
-# continute running TEBD routine with reduced timestep and increased bond dim
-chi = 32
-tau = 0.001
-numiter = 20000
-midsteps = 1000
-A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
-    tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
-
-
-
-
-#subplots showing error as well as ground energy at each h value
-ax1 = plt.subplot(211)
-#plt.plot(time, E_0, label = '$E_0$')
-plt.plot(hz, theory,label = 'theory')
-plt.plot(hz, sim_e, '.', label = 'simulation')
-plt.ylabel('$E_0$/N')
-plt.xlabel('h')
-plt.title('Ground state energy per site vs B field, $\chi$ = %d, timestep = %f'%(chi, tau))
-plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
-
-ax2 = plt.subplot(212, sharex=ax1)
-plt.plot(hz, error, '+', label = 'Percentage error')
-plt.tick_params('x', labelbottom=False)
-plt.ylabel('Error in %')
-plt.legend()
-
-plt.show()
-
-
-plt.plot(hz, error, label = '$\chi = 16$')
-plt.ylabel('Error, in %')
-plt.xlabel('h')
-plt.title('Percentage error in gorund state energy, timestep =  %f'%tau)
-plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
-plt.show()
\ No newline at end of file
+  A1, B1, sAB1, sBA1, _, _, _, _ = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+      tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+  print('dim of A is', np.shape(A1))
+  print('dim of B is', np.shape(B1))
+  print('dim of sAB is', np.shape(sAB1))
+  print('dim of sBA is', np.shape(sBA1))
+  print(find_mz(A1, sAB1, B1, sBA1, sZ))
+  print('h =', h)
+
+
+  #for plotting some of the cases above
+  plt.plot(time, mz_t, label = '$m_z$')
+  plt.ylabel('$m_z$')
+  plt.xlabel('time')
+  plt.title('Average magnetisation vs time, $\chi$ = %d'%chi)
+
+
+  plt.plot(hz, sim_mz_gs, label = 'From ground state, by imaginary time evolution ')
+  plt.plot(hz, sim_mz_realT, '+', label = 'From real time evolution of system')
+  plt.ylabel('$m_z$')
+  plt.xlabel('$h_z$')
+  plt.title('Average magnetisation vs B field, $\chi$ = %d'%chi)
+  plt.legend(loc = 'lower right', bbox_to_anchor = (0.9, 0.1))
+  plt.show()
+
+  A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+      tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+
+
+  # continute running TEBD routine with reduced timestep
+  tau = 0.01
+  numiter = 2000
+  midsteps = 100
+  A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+      tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+
+
+  # continute running TEBD routine with reduced timestep and increased bond dim
+  chi = 32
+  tau = 0.001
+  numiter = 20000
+  midsteps = 1000
+  A, B, sAB, sBA, rhoAB, rhoBA, time, E_0 = doTEBD(hamAB, hamBA, A, B, sAB, sBA, chi,
+      tau, evotype=evotype, numiter=numiter, midsteps=midsteps, E0=E0)
+
+
+
+
+  #subplots showing error as well as ground energy at each h value
+  ax1 = plt.subplot(211)
+  #plt.plot(time, E_0, label = '$E_0$')
+  plt.plot(hz, theory,label = 'theory')
+  plt.plot(hz, sim_e, '.', label = 'simulation')
+  plt.ylabel('$E_0$/N')
+  plt.xlabel('h')
+  plt.title('Ground state energy per site vs B field, $\chi$ = %d, timestep = %f'%(chi, tau))
+  plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
+
+  ax2 = plt.subplot(212, sharex=ax1)
+  plt.plot(hz, error, '+', label = 'Percentage error')
+  plt.tick_params('x', labelbottom=False)
+  plt.ylabel('Error in %')
+  plt.legend()
+
+  plt.show()
+
+
+  plt.plot(hz, error, label = '$\chi = 16$')
+  plt.ylabel('Error, in %')
+  plt.xlabel('h')
+  plt.title('Percentage error in gorund state energy, timestep =  %f'%tau)
+  plt.legend(loc = 'upper right', bbox_to_anchor = (0.9, 0.95))
+  plt.show()
\ No newline at end of file